@@ -439,17 +439,14 @@ def add_child(self, window: Window) -> None:
         self.window_id_map[window.id] = window
 
     def _handle_remote_command(self, cmd: str, window: Optional[Window] = None, peer_id: int = 0) -> Union[Dict[str, Any], None, AsyncResponse]:
-        from .remote_control import handle_cmd
+        from .remote_control import error_response, handle_cmd
         response = None
         window = window or None
         if self.allow_remote_control == 'y' or peer_id > 0 or getattr(window, 'allow_remote_control', False):
             try:
                 response = handle_cmd(self, window, cmd, peer_id)
             except Exception as err:
-                import traceback
-                response = {'ok': False, 'error': str(err)}
-                if not getattr(err, 'hide_traceback', False):
-                    response['tb'] = traceback.format_exc()
+                response = error_response(err)
         else:
             no_response = False
             try:
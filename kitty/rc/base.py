@@ -2,6 +2,7 @@
 # License: GPLv3 Copyright: 2020, Kovid Goyal <kovid at kovidgoyal.net>
 
 from contextlib import suppress
+from functools import lru_cache
 from typing import (
     TYPE_CHECKING, Any, Callable, Dict, FrozenSet, Iterable, Iterator, List,
     NoReturn, Optional, Tuple, Type, Union, cast
@@ -52,6 +53,8 @@ class UnknownLayout(ValueError):
 
 class PayloadGetter:
 
+    __slots__ = ('payload', 'cmd')
+
     def __init__(self, cmd: 'RemoteCommand', payload: Dict[str, Any]):
         self.payload = payload
         self.cmd = cmd
@@ -275,6 +278,7 @@ def display_subcommand_help(func: RemoteCommand) -> None:
         parse_args(['--help'], (func.options_spec or '\n').format, func.argspec, func.desc, func.name)
 
 
+@lru_cache(maxsize=128)
 def command_for_name(cmd_name: str) -> RemoteCommand:
     from importlib import import_module
     cmd_name = cmd_name.replace('-', '_')
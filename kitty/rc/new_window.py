@@ -78,16 +78,11 @@ class NewWindow(RemoteCommand):
     argspec = '[CMD ...]'
 
     def message_to_kitty(self, global_opts: RCOptions, opts: 'CLIOptions', args: ArgsType) -> PayloadType:
-        ans = {'args': args or [], 'type': 'window'}
-        for attr, val in opts.__dict__.items():
-            if attr == 'new_tab':
-                if val:
-                    ans['type'] = 'tab'
-            elif attr == 'window_type':
-                if val == 'os' and ans['type'] != 'tab':
-                    ans['type'] = 'os-window'
-            else:
-                ans[attr] = val
+        d = vars(opts)
+        t = 'tab' if d.get('new_tab') else ('os-window' if d.get('window_type') == 'os' else 'window')
+        ans = {**d, 'args': args or [], 'type': t}
+        ans.pop('new_tab', None)
+        ans.pop('window_type', None)
         return ans
 
     def response_from_kitty(self, boss: Boss, window: Optional[Window], payload_get: PayloadGetType) -> ResponseType:
@@ -3,10 +3,13 @@
 
 import json
 import os
-import re
+import selectors
+import socket
 import sys
+from collections import OrderedDict
 from contextlib import suppress
 from functools import partial
+from itertools import count
 from time import monotonic
 from types import GeneratorType
 from typing import (
@@ -18,28 +21,104 @@
 from .constants import appname, version
 from .fast_data_types import get_boss, read_command_response, send_data_to_peer
 from .rc.base import (
-    NoResponse, ParsingOfArgsFailed, PayloadGetter, all_command_names,
-    command_for_name, parse_subcommand_cli
+    NoResponse, ParsingOfArgsFailed, PayloadGetter, RemoteCommand,
+    all_command_names, command_for_name, parse_subcommand_cli
 )
-from .types import AsyncResponse
+from .types import AsyncResponse, run_once
 from .typing import BossType, WindowType
-from .utils import TTYIO, parse_address_spec
+from .utils import TTYIO, parse_address_spec, write_chunks
 
-active_async_requests: Dict[str, float] = {}
+
+def _dumps(x: Any) -> bytes:
+    # Always ASCII: the TTY parser drops non-printable characters from DCS
+    # sequences and older clients decode responses as ASCII, so orjson,
+    # which has no ensure_ascii, is only used for decoding.
+    return json.dumps(x).encode('ascii')
+
+
+try:
+    from orjson import JSONDecodeError as OrjsonDecodeError, loads as orjson_loads
+
+    def _loads(x: Union[str, bytes]) -> Any:
+        try:
+            return orjson_loads(x)
+        except OrjsonDecodeError:
+            # orjson refuses escaped lone surrogates, which json.dumps emits
+            return json.loads(x)
+except ImportError:
+    def _loads(x: Union[str, bytes]) -> Any:
+        return json.loads(x)
+
+
+active_async_requests: "OrderedDict[str, float]" = OrderedDict()
+_MAX_ASYNC = 32
+# async ids only need to be unique among the requests a kitty instance is
+# tracking. The pid is read at call time so forked processes differ, the
+# random part guards against pid reuse and clients on other machines.
+_async_nonce = os.urandom(4).hex()
+_async_counter = count()
+_DCS_PREFIX = b'\x1bP@kitty-cmd'
+_DCS_SUFFIX = b'\x1b\\'
+
+
+def _wrap_dcs(payload: bytes) -> bytes:
+    return _DCS_PREFIX + payload + _DCS_SUFFIX
+
+
+# shared response for commands that succeed without returning data, must
+# never be modified
+_OK_RESPONSE: Dict[str, Any] = {'ok': True}
+_OK_RESPONSE_BYTES = _wrap_dcs(_dumps(_OK_RESPONSE))
 
 
 def encode_response_for_peer(response: Any) -> bytes:
-    return b'\x1bP@kitty-cmd' + json.dumps(response).encode('utf-8') + b'\x1b\\'
+    if response is _OK_RESPONSE:
+        return _OK_RESPONSE_BYTES
+    return _wrap_dcs(_dumps(response))
+
+
+def error_response(err: Exception) -> Dict[str, Any]:
+    ' Must be called from the except block that caught err, for the traceback '
+    import traceback
+    # str() of a KeyError is the repr of its message, with quotes
+    msg = err.args[0] if isinstance(err, KeyError) and err.args else str(err)
+    response: Dict[str, Any] = {'ok': False, 'error': msg}
+    if not getattr(err, 'hide_traceback', False):
+        response['tb'] = traceback.format_exc()
+    return response
 
 
 def handle_cmd(boss: BossType, window: Optional[WindowType], serialized_cmd: str, peer_id: int) -> Union[Dict[str, Any], None, AsyncResponse]:
-    cmd = json.loads(serialized_cmd)
+    cmd = _loads(serialized_cmd)
     v = cmd['version']
     no_response = cmd.get('no_response', False)
-    if tuple(v)[:2] > version[:2]:
+    if (v[0], v[1]) > (version[0], version[1]):
         if no_response:
             return None
         return {'ok': False, 'error': 'The kitty client you are using to send remote commands is newer than this kitty instance. This is not supported.'}
+    if cmd['cmd'] == '__batch__':
+        return handle_batch(boss, window, cmd, peer_id)
+    return handle_single_cmd(boss, window, cmd, peer_id)
+
+
+def handle_batch(boss: BossType, window: Optional[WindowType], cmd: Dict[str, Any], peer_id: int) -> Optional[Dict[str, Any]]:
+    results: List[Optional[Dict[str, Any]]] = []
+    for sub_cmd in (cmd.get('payload') or {}).get('cmds', ()):
+        ans: Union[Dict[str, Any], None, AsyncResponse]
+        try:
+            if command_for_name(sub_cmd['cmd']).is_asynchronous:
+                raise ValueError(f'The asynchronous command {sub_cmd["cmd"]} cannot be batched')
+            ans = handle_single_cmd(boss, window, sub_cmd, peer_id)
+        except Exception as err:
+            ans = error_response(err)
+        results.append(None if isinstance(ans, AsyncResponse) else ans)
+    if cmd.get('no_response', False):
+        return None
+    return {'ok': True, 'data': results}
+
+
+def handle_single_cmd(boss: BossType, window: Optional[WindowType], cmd: Dict[str, Any], peer_id: int) -> Union[Dict[str, Any], None, AsyncResponse]:
+    no_response = cmd.get('no_response', False)
     c = command_for_name(cmd['cmd'])
     payload = cmd.get('payload') or {}
     payload['peer_id'] = peer_id
@@ -51,9 +130,9 @@ def handle_cmd(boss: BossType, window: Optional[WindowType], serialized_cmd: str
             c.cancel_async_request(boss, window, PayloadGetter(c, payload))
             return None
         active_async_requests[async_id] = monotonic()
-        if len(active_async_requests) > 32:
-            oldest = next(iter(active_async_requests))
-            del active_async_requests[oldest]
+        active_async_requests.move_to_end(async_id)
+        if len(active_async_requests) > _MAX_ASYNC:
+            active_async_requests.popitem(last=False)
     try:
         ans = c.response_from_kitty(boss, window, PayloadGetter(c, payload))
     except Exception:
@@ -64,12 +143,11 @@ def handle_cmd(boss: BossType, window: Optional[WindowType], serialized_cmd: str
         return None
     if isinstance(ans, AsyncResponse):
         return ans
-    response: Dict[str, Any] = {'ok': True}
-    if ans is not None:
-        response['data'] = ans
-    if not c.no_response and not no_response:
-        return response
-    return None
+    if c.no_response or no_response:
+        return None
+    if ans is None:
+        return _OK_RESPONSE
+    return {'ok': True, 'data': ans}
 
 
 global_options_spec = partial('''\
@@ -82,53 +160,92 @@ def handle_cmd(boss: BossType, window: Optional[WindowType], serialized_cmd: str
 
 
 def encode_send(send: Any) -> bytes:
-    es = ('@kitty-cmd' + json.dumps(send)).encode('ascii')
-    return b'\x1bP' + es + b'\x1b\\'
+    return _wrap_dcs(_dumps(send))
 
 
 class SocketIO:
 
+    __slots__ = ('family', 'address', 'socket')
+
     def __init__(self, to: str):
         self.family, self.address = parse_address_spec(to)[:2]
 
     def __enter__(self) -> None:
-        import socket
         self.socket = socket.socket(self.family)
         self.socket.setblocking(True)
+        if self.family in (socket.AF_INET, socket.AF_INET6):
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         self.socket.connect(self.address)
 
     def __exit__(self, *a: Any) -> None:
-        import socket
         with suppress(OSError):  # on some OSes such as macOS the socket is already closed at this point
             self.socket.shutdown(socket.SHUT_RDWR)
         self.socket.close()
 
     def send(self, data: Union[bytes, Iterable[Union[str, bytes]]]) -> None:
-        import socket
-        with self.socket.makefile('wb') as out:
-            if isinstance(data, bytes):
-                out.write(data)
-            else:
-                for chunk in data:
-                    if isinstance(chunk, str):
-                        chunk = chunk.encode('utf-8')
-                    out.write(chunk)
-                    out.flush()
+        if isinstance(data, bytes):
+            self.socket.sendall(data)
+        else:
+            # coalesce small chunks into fewer writes, without holding the
+            # entire, possibly very large, payload in memory. MSG_MORE (Linux
+            # only) tells the kernel more data follows, so it can avoid
+            # sending partial segments until the final write.
+            more = getattr(socket, 'MSG_MORE', 0)
+            pending: List[bytes] = []
+            pending_size = 0
+            for chunk in data:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                pending.append(chunk)
+                pending_size += len(chunk)
+                if pending_size >= 65536:
+                    self.socket.sendall(b''.join(pending), more)
+                    pending, pending_size = [], 0
+            if pending:
+                self.socket.sendall(b''.join(pending))
         self.socket.shutdown(socket.SHUT_WR)
 
     def simple_recv(self, timeout: float) -> bytes:
-        dcs = re.compile(br'\x1bP@kitty-cmd([^\x1b]+)\x1b\\')
-        self.socket.settimeout(timeout)
-        with self.socket.makefile('rb') as src:
-            data = src.read()
-        m = dcs.search(data)
-        if m is None:
+        data = bytearray()
+        deadline = monotonic() + timeout
+        with selectors.DefaultSelector() as sel:
+            sel.register(self.socket, selectors.EVENT_READ)
+            while True:
+                remaining = deadline - monotonic()
+                if remaining <= 0 or not sel.select(remaining):
+                    raise TimeoutError('Timed out while waiting to read cmd response')
+                chunk = self.socket.recv(65536)
+                if not chunk:
+                    break
+                # start one byte back in case the terminator straddles two chunks
+                start = max(0, len(data) - 1)
+                data += chunk
+                if data.find(_DCS_SUFFIX, start) > -1:
+                    break
+        start = data.find(_DCS_PREFIX)
+        end = -1 if start < 0 else data.find(_DCS_SUFFIX, start + len(_DCS_PREFIX))
+        if end < 0:
             raise TimeoutError('Timed out while waiting to read cmd response')
-        return bytes(m.group(1))
+        return bytes(data[start + len(_DCS_PREFIX):end])
+
+    def send_only(self, data: Union[bytes, Iterable[Union[str, bytes]]]) -> None:
+        with self:
+            self.send(data)
 
 
 class RCIO(TTYIO):
 
+    def send_only(self, data: Union[bytes, Iterable[Union[str, bytes]]]) -> None:
+        # No response will be read, so there is no need to put the TTY into
+        # raw mode, just open it for writing. This leaves output processing
+        # (OPOST/ONLCR) active, which is fine only because encoded commands
+        # never contain a raw newline.
+        fd = os.open(os.ctermid(), os.O_WRONLY | os.O_CLOEXEC | os.O_NOCTTY)
+        try:
+            write_chunks(fd, data)
+        finally:
+            os.close(fd)
+
     def simple_recv(self, timeout: float) -> bytes:
         ans: List[bytes] = []
         read_command_response(self.tty_fd, timeout, ans)
@@ -148,13 +265,14 @@ def send_generator() -> Iterator[bytes]:
         send_data = send_generator()
 
     io: Union[SocketIO, RCIO] = SocketIO(to) if to else RCIO()
+    if no_response:
+        io.send_only(send_data)
+        return {'ok': True}
     with io:
         io.send(send_data)
-        if no_response:
-            return {'ok': True}
         received = io.simple_recv(timeout=response_timeout)
 
-    return cast(Dict[str, Any], json.loads(received.decode('ascii')))
+    return cast(Dict[str, Any], _loads(received))
 
 
 cli_msg = (
@@ -164,13 +282,35 @@ def send_generator() -> Iterator[bytes]:
 ).format(appname=appname)
 
 
+@run_once
+def _command_map() -> Dict[str, RemoteCommand]:
+    return {name: command_for_name(name) for name in sorted(all_command_names())}
+
+
+def _global_help_requested(args: List[str]) -> bool:
+    # only look at the global options, that is the arguments before the
+    # command name, as commands have their own -h
+    it = iter(args)
+    for arg in it:
+        if arg in ('-h', '--help'):
+            return True
+        if arg == '--' or not arg.startswith('-'):
+            break
+        if '=' not in arg:
+            next(it, None)  # the value of --to
+    return False
+
+
 def parse_rc_args(args: List[str]) -> Tuple[RCOptions, List[str]]:
-    cmap = {name: command_for_name(name) for name in sorted(all_command_names())}
-    cmds = (f'  :green:`{cmd.name}`\n    {cmd.short_desc}' for c, cmd in cmap.items())
-    msg = cli_msg + (
-            '\n\n:title:`Commands`:\n{cmds}\n\n'
-            'You can get help for each individual command by using:\n'
-            '{appname} @ :italic:`command` -h').format(appname=appname, cmds='\n'.join(cmds))
+    msg = cli_msg
+    # listing the commands requires importing all of them, so only do it when
+    # the help text can actually be shown
+    if _global_help_requested(args[1:]):
+        cmds = (f'  :green:`{cmd.name}`\n    {cmd.short_desc}' for cmd in _command_map().values())
+        msg += (
+                '\n\n:title:`Commands`:\n{cmds}\n\n'
+                'You can get help for each individual command by using:\n'
+                '{appname} @ :italic:`command` -h').format(appname=appname, cmds='\n'.join(cmds))
     return parse_args(args[1:], global_options_spec, 'command ...', msg, f'{appname} @', result_class=RCOptions)
 
 
@@ -179,11 +319,14 @@ def create_basic_command(name: str, payload: Any = None, no_response: bool = Fal
     if payload is not None:
         ans['payload'] = payload
     if is_asynchronous:
-        from kitty.short_uuid import uuid4
-        ans['async'] = uuid4()
+        ans['async'] = f'{os.getpid():x}-{_async_nonce}-{next(_async_counter):x}'
     return ans
 
 
+def create_batch_command(cmds: List[Dict[str, Any]], no_response: bool = False) -> Dict[str, Any]:
+    return {'cmd': '__batch__', 'version': version, 'no_response': no_response, 'payload': {'cmds': cmds}}
+
+
 def send_response_to_client(data: Any = None, error: str = '', peer_id: int = 0, window_id: int = 0, async_id: str = '') -> None:
     ts = active_async_requests.pop(async_id, None)
     if ts is None:
@@ -237,7 +380,6 @@ def main(args: List[str]) -> None:
             if listen_on_from_env:
                 msg += '. The KITTY_LISTEN_ON environment variable is set incorrectly'
             exit(msg)
-    import socket
     try:
         response = do_io(global_opts.to, send, no_response, response_timeout)
     except (TimeoutError, socket.timeout):
@@ -529,6 +529,14 @@ def write_all(fd: int, data: Union[str, bytes], block_until_written: bool = True
         data = data[n:]
 
 
+def write_chunks(fd: int, data: Union[str, bytes, Iterable[Union[str, bytes]]]) -> None:
+    if isinstance(data, (str, bytes)):
+        write_all(fd, data)
+    else:
+        for chunk in data:
+            write_all(fd, chunk)
+
+
 class TTYIO:
 
     def __init__(self, read_with_timeout: bool = True):
@@ -553,11 +561,7 @@ def read(self, limit: int) -> bytes:
         return os.read(self.tty_fd, limit)
 
     def send(self, data: Union[str, bytes, Iterable[Union[str, bytes]]]) -> None:
-        if isinstance(data, (str, bytes)):
-            write_all(self.tty_fd, data)
-        else:
-            for chunk in data:
-                write_all(self.tty_fd, chunk)
+        write_chunks(self.tty_fd, data)
 
     def recv(self, more_needed: Callable[[bytes], bool], timeout: float, sz: int = 1) -> None:
         fd = self.tty_fd
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# License: GPL v3 Copyright: 2022, Kovid Goyal <kovid at kovidgoyal.net>
+
+
+import json
+import socket
+import time
+from contextlib import contextmanager
+from threading import Thread
+
+from kitty.rc.base import RemoteCommand, no_response
+
+from . import BaseTest
+
+
+class Cmd(RemoteCommand):
+
+    def __init__(self, name, ret=None, is_asynchronous=False):
+        super().__init__()
+        self.name, self.ret, self.is_asynchronous = name, ret, is_asynchronous
+        self.calls = []
+
+    def response_from_kitty(self, boss, window, payload_get):
+        self.calls.append(payload_get('x'))
+        if isinstance(self.ret, Exception):
+            raise self.ret
+        return self.ret
+
+
+@contextmanager
+def patch_commands(*cmds):
+    import kitty.remote_control as rc
+    cmap = {c.name: c for c in cmds}
+
+    def command_for_name(name):
+        try:
+            return cmap[name]
+        except KeyError:
+            raise KeyError(f'Unknown kitty remote control command: {name}')
+
+    orig = rc.command_for_name
+    rc.command_for_name = command_for_name
+    try:
+        yield
+    finally:
+        rc.command_for_name = orig
+
+
+class TestRemoteControl(BaseTest):
+
+    def test_batch_commands(self):
+        from kitty.remote_control import (
+            create_basic_command, create_batch_command, error_response,
+            handle_cmd
+        )
+
+        def batch(*cmds, **kw):
+            return handle_cmd(None, None, json.dumps(create_batch_command(list(cmds), **kw)), 0)
+
+        def sub(name, **payload):
+            return create_basic_command(name, payload)
+
+        a, b = Cmd('a'), Cmd('b', 'data')
+        silent, failing = Cmd('silent', no_response), Cmd('failing', ValueError('failed'))
+        asynchronous = Cmd('async', is_asynchronous=True)
+        with patch_commands(a, b, silent, failing, asynchronous):
+            r = batch(sub('b', x=1), sub('a', x=2), sub('b', x=3))
+            self.ae(r, {'ok': True, 'data': [{'ok': True, 'data': 'data'}, {'ok': True}, {'ok': True, 'data': 'data'}]})
+            self.ae(b.calls, [1, 3])
+            self.ae(a.calls, [2])
+
+            r = batch(sub('silent'), create_basic_command('a', no_response=True), sub('a'))
+            self.ae(r['data'], [None, None, {'ok': True}])
+
+            r = batch(sub('async'), sub('unknown'), sub('failing'), sub('a'))
+            self.assertFalse(asynchronous.calls)
+            self.ae([x['ok'] for x in r['data']], [False, False, False, True])
+            self.assertIn('cannot be batched', r['data'][0]['error'])
+            self.ae(r['data'][1]['error'], 'Unknown kitty remote control command: unknown')
+            self.ae(r['data'][2]['error'], 'failed')
+            self.assertIn('tb', r['data'][2])
+            # errors are reported the same way as for single commands
+            with self.assertRaises(KeyError) as cm:
+                handle_cmd(None, None, json.dumps(create_basic_command('unknown')), 0)
+            self.ae(error_response(cm.exception)['error'], r['data'][1]['error'])
+
+            del a.calls[:]
+            self.assertIsNone(batch(sub('a'), sub('failing'), no_response=True))
+            self.ae(len(a.calls), 1)
+
+    def test_socket_recv(self):
+        from kitty.remote_control import SocketIO
+
+        a, b = socket.socketpair()
+        io = SocketIO.__new__(SocketIO)
+        io.socket = a
+
+        def send_slowly(data):
+            for i in range(len(data)):
+                b.sendall(data[i:i+1])
+                time.sleep(0.002)
+
+        try:
+            # one byte at a time, so the terminator is split across reads,
+            # and with the connection kept open, as for async responses
+            t = Thread(target=send_slowly, args=(b'junk\x1bP@kitty-cmd{"ok": true}\x1b\\',))
+            t.start()
+            self.ae(io.simple_recv(timeout=5), b'{"ok": true}')
+            t.join()
+            b.sendall(b'\x1bP@kitty-cmd{"ok": ')
+            st = time.monotonic()
+            with self.assertRaises(TimeoutError):
+                io.simple_recv(timeout=0.2)
+            self.assertLess(time.monotonic() - st, 2)
+        finally:
+            a.close()
+            b.close()
+
+    def test_global_help_detection(self):
+        from kitty.remote_control import _global_help_requested
+        for args, expected in (
+            (['-h'], True),
+            (['--help'], True),
+            (['--to', 'x', '-h'], True),
+            (['--to=x', '--help'], True),
+            (['--to', '-h', 'ls'], False),
+            (['--to=x', 'ls', '-h'], False),
+            (['ls', '--help'], False),
+            (['launch', 'grep', '-h', 'x'], False),
+            (['--', '-h'], False),
+            ([], False),
+        ):
+            self.ae(_global_help_requested(args), expected, f'{args}')